@@ -6,8 +6,11 @@ import time
 import shutil
 import asyncio
 import logging
+import functools
+import concurrent.futures
+from collections import Counter, OrderedDict, deque
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Any, Union
+from typing import Dict, List, Set, Tuple, Optional, Any, Union
 
 import discord
 from discord.ext import commands
@@ -22,6 +25,165 @@ logging.basicConfig(
 )
 logger = logging.getLogger("musicbot")
 
+# Environment values that enable a boolean setting
+_TRUTHY = frozenset({"true", "t", "1", "yes", "y", "on"})
+
+# Arguments to the skip command that skip the whole queue
+_SKIP_ALL = frozenset({"all", "todo", "todas", "*"})
+
+# Upper bound on message IDs tracked for command deduplication
+MAX_ACTIVE_COMMANDS = 1024
+
+# FFmpeg output options for voice playback
+FFMPEG_OPTIONS = "-vn -ac 2 -b:a 96k -vbr on"
+# Let FFmpeg recover from dropped connections when streaming
+FFMPEG_STREAM_BEFORE_OPTIONS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+
+# YouTube video IDs in watch, short-link, shorts and embed URLs
+_YT_ID_RE = re.compile(r"(?:v=|youtu\.be/|/shorts/|/embed/)([A-Za-z0-9_-]{11})")
+# Queries that are URLs rather than search terms
+_URL_RE = re.compile(r"^https?://", re.IGNORECASE)
+
+# ANSI color codes and the leading "ERROR:" in yt-dlp error messages
+_ANSI_RE = re.compile(r"\x1b[^m]*m")
+_ERROR_PREFIX_RE = re.compile(r"^error\s*:?\s*", re.IGNORECASE)
+
+# Resolved track metadata is reused for this many seconds
+META_CACHE_TTL = 24 * 60 * 60
+# Upper bound on cached metadata entries
+MAX_META_CACHE_ENTRIES = 512
+
+
+def _ydl_options(server_id: int) -> Dict[str, Any]:
+    """Build the yt-dlp options used for a server's downloads."""
+    return {
+        "format": "bestaudio[ext=webm]/bestaudio",
+        "source_address": "0.0.0.0",
+        "outtmpl": f"./dl/{server_id}/%(id)s.%(ext)s",
+        "noplaylist": True,
+        "socket_timeout": 10,
+        "retries": 3,
+        "quiet": True
+    }
+
+
+def _extract_info_sync(query: str, server_id: int) -> Optional[Dict[str, Any]]:
+    """Resolve `query` with yt-dlp without downloading anything.
+
+    Runs in a worker thread, so it builds its own YoutubeDL instance.
+    Returns the info dict of the first result, or None if nothing was found.
+    """
+    options = _ydl_options(server_id)
+    if not _URL_RE.match(query):
+        # Plain text is treated as a YouTube search
+        options["default_search"] = "ytsearch"
+
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(query, download=False)
+        if "entries" in info:
+            if not info["entries"]:
+                return None
+            info = info["entries"][0]
+    return info
+
+
+def _download_sync(info: Dict[str, Any], server_id: int):
+    """Download the track described by `info` into the server's directory."""
+    with yt_dlp.YoutubeDL(_ydl_options(server_id)) as ydl:
+        ydl.download([info["webpage_url"]])
+
+
+def _meta_cache_key(query: str) -> str:
+    """Normalize a query so equivalent searches and URLs share a cache entry."""
+    match = _YT_ID_RE.search(query)
+    if match:
+        return match.group(1)
+    # Only plain searches are case-insensitive; URL paths and IDs are not
+    if _URL_RE.match(query):
+        return query.strip()
+    return query.strip().lower()
+
+
+@functools.lru_cache(maxsize=4096)
+def _fmt_ms(sec: int) -> str:
+    """Format a track duration as MM:SS."""
+    return "Unknown" if not sec else f"{sec // 60:02d}:{sec % 60:02d}"
+
+
+@functools.lru_cache(maxsize=256)
+def _fmt_hms(sec: int) -> str:
+    """Format a total duration as H:MM:SS."""
+    return "Unknown" if not sec else f"{sec // 3600:d}:{(sec // 60) % 60:02d}:{sec % 60:02d}"
+
+
+def _pop_track(queue_data: Dict[str, Any]) -> Tuple[str, bool]:
+    """Remove the track at the head of the queue.
+
+    Returns its path and whether that path is still queued further on.
+    """
+    path, _ = queue_data["queue"].popleft()
+    path_counts = queue_data["path_counts"]
+    path_counts[path] -= 1
+    if path_counts[path] <= 0:
+        del path_counts[path]
+        return path, False
+    return path, True
+
+
+def _remove_unqueued_files(server_dir: str, queue_files: set) -> int:
+    """Remove files in `server_dir` that aren't in `queue_files`; return how many were removed."""
+    files_removed = 0
+    for file_path in Path(server_dir).glob("*"):
+        if os.path.normpath(file_path) not in queue_files:
+            try:
+                file_path.unlink(missing_ok=True)
+                files_removed += 1
+            except PermissionError as e:
+                logger.warning(f"Failed to remove {file_path}: {e}")
+    return files_removed
+
+
+def _cleanup_dir_sync(directory_path: str):
+    """Remove a server's download directory and everything in it."""
+    if not os.path.exists(directory_path):
+        return
+
+    # First try to remove individual files
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    # Then try to remove the directory
+    try:
+        shutil.rmtree(directory_path)
+    except Exception as e:
+        logger.warning(f"Failed to remove directory {directory_path}: {e}")
+
+
+def _require_active(handler):
+    """Run a MusicBot command handler only if the server has an active queue.
+
+    Performs the usual sense checks, then exposes the server's queue data
+    to the handler as `ctx.queue_data`.
+    """
+    @functools.wraps(handler)
+    async def wrapper(self, ctx: commands.Context, *args, **kwargs):
+        if not await self.sense_checks(ctx):
+            return
+
+        queue_data = self._active_queue(ctx.guild.id)
+        if queue_data is None:
+            await ctx.send("The bot isn't playing anything.")
+            return
+
+        ctx.queue_data = queue_data
+        return await handler(self, ctx, *args, **kwargs)
+
+    return wrapper
+
 
 class MusicBot:
     """Discord Music Bot for playing audio from YouTube in voice channels."""
@@ -31,9 +193,10 @@ class MusicBot:
         load_dotenv()
         self.token = os.getenv("BOT_TOKEN")
         self.prefix = os.getenv("BOT_PREFIX", ".")
-        self.print_stack_trace = os.getenv("PRINT_STACK_TRACE", "1").lower() in ("true", "t", "1")
-        self.report_command_not_found = os.getenv("BOT_REPORT_COMMAND_NOT_FOUND", "1").lower() in ("true", "t", "1")
-        self.report_dl_error = os.getenv("BOT_REPORT_DL_ERROR", "0").lower() in ("true", "t", "1")
+        self.print_stack_trace = os.getenv("PRINT_STACK_TRACE", "1").lower() in _TRUTHY
+        self.report_command_not_found = os.getenv("BOT_REPORT_COMMAND_NOT_FOUND", "1").lower() in _TRUTHY
+        self.report_dl_error = os.getenv("BOT_REPORT_DL_ERROR", "0").lower() in _TRUTHY
+        self.stream_audio = os.getenv("BOT_STREAM_AUDIO", "0").lower() in _TRUTHY
         self.skip_in_progress = set()  # Track servers with skip operations in progress
 
         try:
@@ -42,6 +205,13 @@ class MusicBot:
             logger.warning("Invalid BOT_COLOR in .env, using default (ff0000).")
             self.color = 0x915CBF
 
+        # Silence between tracks, in seconds
+        try:
+            self.track_gap_seconds = float(os.getenv("TRACK_GAP", "0"))
+        except ValueError:
+            logger.warning("Invalid TRACK_GAP in .env, using default (0).")
+            self.track_gap_seconds = 0.0
+
         # Setup intents
         intents = discord.Intents.default()
         intents.voice_states = True
@@ -59,168 +229,172 @@ class MusicBot:
         # Remove the default help command
         self.bot.remove_command('help')
 
-        # Queue data: {server_id: {'queue': [(path, info_dict), ...], 'loop': bool, 'volume': float}}
+        # Queue data: {server_id: {'queue': deque([(path, info_dict), ...]), 'path_counts': Counter({path: n}),
+        #                          'loop': bool, 'volume': float}}
         self.queues = {}
 
-        # Lock for queue modifications
-        self.queue_lock = asyncio.Lock()
+        # Worker threads for blocking yt-dlp extraction and downloads
+        try:
+            ydl_workers = max(1, int(os.getenv("YDL_WORKERS", "4")))
+        except ValueError:
+            logger.warning("Invalid YDL_WORKERS in .env, using default (4).")
+            ydl_workers = 4
+        self._ydl_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=ydl_workers,
+            thread_name_prefix="ydl",
+        )
+
+        # Worker threads for file removal
+        self._io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="fs")
+
+        # Recently resolved track metadata: {cache_key: (timestamp, info_dict)}
+        self._meta_cache = OrderedDict()
+
+        # Per-server locks for queue modifications, so servers don't wait on each other
+        self._guild_locks: Dict[int, asyncio.Lock] = {}
+
+        # Background tasks still running (cleanups, prefetches, track transitions)
+        self._bg_tasks: Set[asyncio.Task] = set()
+
+        # FFmpeg sources started ahead of time for each server's next track: {server_id: (path, source)}
+        self._prefetched: Dict[int, Tuple[str, discord.FFmpegOpusAudio]] = {}
+
+        # Voice clients by the ID of the channel they're in, maintained from voice state updates
+        self._vc_by_channel: Dict[int, discord.VoiceClient] = {}
 
-        # Modified command processing flag to prevent duplicates
-        self.active_commands = set()
+        # Voice connects in flight for each server, shared by every command that needs one
+        self._connecting: Dict[int, asyncio.Task] = {}
 
-        # Create download directory
+        # Per-server events set whenever a track finishes playing. Kept apart from
+        # self.queues because a skip drops the queue before stopping playback.
+        self._track_ended: Dict[int, asyncio.Event] = {}
+
+        # Message IDs of commands currently being processed, to prevent duplicates
+        self.active_commands = OrderedDict()
+
+        # Start from an empty download directory
+        shutil.rmtree("./dl", ignore_errors=True)
         os.makedirs("./dl", exist_ok=True)
 
         # Register commands and events
         self._register_commands()
         self._register_events()
 
+        # Help embeds are static, so build them once
+        self._help_embed = self._build_help_embed()
+        self._ayuda_embed = self._build_ayuda_embed()
+
+    def _dedupe(self, handler):
+        """Wrap a command handler so each message is only processed once."""
+        async def wrapper(ctx: commands.Context, *args, **kwargs):
+            message_id = ctx.message.id
+            if message_id in self.active_commands:
+                return
+            self.active_commands[message_id] = None
+            if len(self.active_commands) > MAX_ACTIVE_COMMANDS:
+                self.active_commands.popitem(last=False)
+
+            try:
+                await handler(ctx, *args, **kwargs)
+            finally:
+                self.active_commands.pop(message_id, None)
+
+        return wrapper
+
+    def _get_cached_info(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return cached track metadata for `key` if it hasn't expired."""
+        entry = self._meta_cache.get(key)
+        if entry is None:
+            return None
+
+        timestamp, info = entry
+        if time.monotonic() - timestamp > META_CACHE_TTL:
+            del self._meta_cache[key]
+            return None
+
+        self._meta_cache.move_to_end(key)
+        return info
+
+    def _cache_info(self, key: str, info: Dict[str, Any]):
+        """Store track metadata for `key`, evicting the least recently used entry."""
+        self._meta_cache[key] = (time.monotonic(), info)
+        self._meta_cache.move_to_end(key)
+        if len(self._meta_cache) > MAX_META_CACHE_ENTRIES:
+            self._meta_cache.popitem(last=False)
+
+    def _lock(self, server_id: int) -> asyncio.Lock:
+        """Return the queue lock for `server_id`."""
+        return self._guild_locks.setdefault(server_id, asyncio.Lock())
+
+    def _track_ended_event(self, server_id: int) -> asyncio.Event:
+        """Return the event set when a track finishes on `server_id`."""
+        return self._track_ended.setdefault(server_id, asyncio.Event())
+
+    def _active_queue(self, server_id: int) -> Optional[Dict[str, Any]]:
+        """Return the server's queue data if it has any tracks queued, else None."""
+        queue_data = self.queues.get(server_id)
+        if queue_data is None or not queue_data["queue"]:
+            return None
+        return queue_data
+
     def _register_commands(self):
         """Register bot commands."""
 
         @self.bot.command(name="queue", aliases=["lista", "q"])
         async def cmd_queue(ctx: commands.Context):
             """Show the current queue for this server."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_queue(ctx)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_queue)(ctx)
 
         @self.bot.command(name="skip", aliases=["s", "siguiente", "pasar", "next"])
         async def cmd_skip(ctx: commands.Context, *args):
             """Skip 1 or more tracks. Usage: .skip [n] or .skip all"""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_skip(ctx, args)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_skip)(ctx, args)
 
         @self.bot.command(name="play", aliases=["p"])
         async def cmd_play(ctx: commands.Context, *, query: str = None):
             """Play a given search query or URL from YouTube."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_play(ctx, query)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_play)(ctx, query)
 
         @self.bot.command(name="loop", aliases=["l"])
         async def cmd_loop(ctx: commands.Context):
             """Toggle looping of the current queue."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_loop(ctx)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_loop)(ctx)
 
         @self.bot.command(name="nowplaying", aliases=["np", "sonando"])
         async def cmd_now_playing(ctx: commands.Context):
             """Display information about the currently playing track."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_now_playing(ctx)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_now_playing)(ctx)
 
         @self.bot.command(name="pause", aliases=["pa", "parar", "pausa"])
         async def cmd_pause(ctx: commands.Context):
             """Pause the currently playing track."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_pause(ctx)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_pause)(ctx)
 
         @self.bot.command(name="resume", aliases=["r", "continuar", "unpausar"])
         async def cmd_resume(ctx: commands.Context):
             """Resume the paused track."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_resume(ctx)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_resume)(ctx)
 
         @self.bot.command(name="volume", aliases=["v"])
         async def cmd_volume(ctx: commands.Context, volume: str = None):
             """Set the volume (0-100). Usage: .volume [level]"""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_volume(ctx, volume)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_volume)(ctx, volume)
 
         @self.bot.command(name="cleanup", aliases=["clean"])
         async def cmd_cleanup(ctx: commands.Context):
             """Clean up downloaded files."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_cleanup(ctx)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_cleanup)(ctx)
 
         @self.bot.command(name="help", aliases=["h"])
         async def cmd_help(ctx: commands.Context):
             """Show help information."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_help(ctx)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_help)(ctx)
 
         # Add this to your _register_commands method:
         @self.bot.command(name="ayuda", aliases=["a"])
         async def cmd_ayuda(ctx: commands.Context):
             """Muestra información de ayuda en español."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_ayuda(ctx)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self._dedupe(self.handle_ayuda)(ctx)
 
     def _register_events(self):
         """Register bot events."""
@@ -229,22 +403,14 @@ class MusicBot:
         async def on_ready():
             logger.info(f"Logged in successfully as {self.bot.user.name}")
 
-            # Clean up download directory on startup
-            for server_dir in Path("./dl").glob("*"):
-                if server_dir.is_dir():
-                    try:
-                        shutil.rmtree(server_dir)
-                    except Exception as e:
-                        logger.warning(f"Failed to clean up directory {server_dir}: {e}")
-
-            # Clean active commands set
+            # Clear tracked active commands
             self.active_commands.clear()
 
             # Update presence in a loop
             async def heartbeat():
+                activity = discord.Game(f"Music 🎵 | {self.prefix}help")
                 while not self.bot.is_closed():
-                    activity_text = "Music 🎵 | " + self.prefix + "help"
-                    await self.bot.change_presence(activity=discord.Game(activity_text))
+                    await self.bot.change_presence(activity=activity)
                     await asyncio.sleep(20)
 
             self.bot.loop.create_task(heartbeat())
@@ -252,56 +418,34 @@ class MusicBot:
         @self.bot.event
         async def on_command_error(ctx: commands.Context, error: commands.CommandError):
             """Handle errors gracefully."""
-            # Dedupe command processing
-            if ctx.message.id in self.active_commands:
-                return
-            self.active_commands.add(ctx.message.id)
-
-            try:
-                await self.handle_command_error(ctx, error)
-            finally:
-                self.active_commands.discard(ctx.message.id)
+            await self.handle_command_error(ctx, error)
 
         @self.bot.event
         async def on_voice_state_update(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
             """Handle voice state changes."""
             await self.handle_voice_state_update(member, before, after)
 
+    @_require_active
     async def handle_queue(self, ctx: commands.Context):
         """Show the current queue for this server."""
-        if not await self.sense_checks(ctx):
-            return
-
-        server_id = ctx.guild.id
-
-        # Add check if server exists in queues
-        if server_id not in self.queues:
-            await ctx.send("The bot isn't playing anything right now.")
-            return
-
-        track_queue = self.queues[server_id].get("queue", [])
-
-        if not track_queue:
-            await ctx.send("The bot isn't playing anything right now.")
-            return
+        queue_data = ctx.queue_data
+        track_queue = queue_data["queue"]
 
-        def fmt(i_title):
-            i, (_, info) = i_title
+        lines = []
+        for i, (_, info) in enumerate(track_queue):
             title = info.get("title", "Unknown")
-            duration = info.get("duration", 0)
-            duration_str = time.strftime("%M:%S", time.gmtime(duration)) if duration else "Unknown"
+            duration_str = _fmt_ms(int(info.get("duration") or 0))
 
             if i == 0:
-                return f"▷ {title} [{duration_str}]\n\n"
+                lines.append(f"▷ {title} [{duration_str}]\n\n")
             else:
-                return f"**{i}:** {title} [{duration_str}]\n"
+                lines.append(f"**{i}:** {title} [{duration_str}]\n")
 
-        queue_items = enumerate(track_queue)
-        queue_str = "".join(map(fmt, queue_items))
+        queue_str = "".join(lines)
 
         # Calculate total duration
-        total_duration = sum(info.get("duration", 0) for _, info in track_queue)
-        total_duration_str = time.strftime("%H:%M:%S", time.gmtime(total_duration)) if total_duration else "Unknown"
+        total_duration = sum(info.get("duration") or 0 for _, info in track_queue)
+        total_duration_str = _fmt_hms(int(total_duration))
 
         # Create embed
         embed = discord.Embed(color=self.color, title="Music Queue")
@@ -310,28 +454,16 @@ class MusicBot:
         embed.add_field(name="Tracks in queue:", value=str(len(track_queue)), inline=True)
 
         # Show loop status
-        loop_status = self.queues.get(server_id, {}).get("loop", False)
+        loop_status = queue_data["loop"]
         embed.add_field(name="Loop:", value="Enabled" if loop_status else "Disabled", inline=True)
 
         await ctx.send(embed=embed)
 
+    @_require_active
     async def handle_skip(self, ctx: commands.Context, args):
         """Skip 1 or more tracks."""
-        if not await self.sense_checks(ctx):
-            return
-
         server_id = ctx.guild.id
-
-        # Check if server exists in queues
-        if server_id not in self.queues:
-            await ctx.send("The bot isn't playing anything.")
-            return
-
-        queue_data = self.queues[server_id]
-        if not queue_data or not queue_data.get("queue"):
-            await ctx.send("The bot isn't playing anything.")
-            return
-
+        queue_data = ctx.queue_data
         track_queue = queue_data["queue"]
 
         # Determine how many tracks to skip
@@ -339,7 +471,7 @@ class MusicBot:
         if args:
             if args[0].isdigit():
                 n_skips = int(args[0])
-            elif args[0].lower() == "all":
+            elif args[0].lower() in _SKIP_ALL:
                 n_skips = len(track_queue)
 
         if n_skips >= len(track_queue):
@@ -362,48 +494,53 @@ class MusicBot:
 
         # Handle skipping all tracks
         if n_skips >= len(track_queue):
-            # Stop current playback
-            if voice_client and voice_client.is_playing():
-                voice_client.stop()
-                await asyncio.sleep(0.5)
-
-            # Store paths to remove
-            files_to_remove = [path for path, _ in track_queue]
-
-            # Clear queue
-            track_queue.clear()
+            # Hold the lock until disconnected so a concurrent play waits and reconnects
+            async with self._lock(server_id):
+                # Store paths to remove
+                files_to_remove = [path for path, _ in track_queue]
+
+                # Clear the queue and remove it from queues first,
+                # so the after-track callback doesn't start anything new
+                track_queue.clear()
+                queue_data["path_counts"].clear()
+                self.queues.pop(server_id, None)
 
-            # Disconnect
-            await voice_client.disconnect()
+                # Stop current playback and wait for the after-track callback to fire
+                if voice_client.is_playing():
+                    track_ended = self._track_ended_event(server_id)
+                    track_ended.clear()
+                    voice_client.stop()
+                    try:
+                        await asyncio.wait_for(track_ended.wait(), timeout=2.0)
+                    except asyncio.TimeoutError:
+                        pass
 
-            # Remove from queues
-            self.queues.pop(server_id, None)
+                # Disconnect
+                self._discard_prefetch(server_id)
+                await voice_client.disconnect()
 
             # Remove files
             for path in files_to_remove:
-                self._try_remove_file(path)
+                self._remove_async(path)
             return
 
-        # Store paths to remove
-        files_to_remove = []
-
-        # Remove tracks from queue
-        files_to_remove = []
-        for _ in range(n_skips):
-            if track_queue:
-                path, _ = track_queue.pop(0)
-                if all(path != item[0] for item in track_queue):
-                    files_to_remove.append(path)
+        # Remove tracks from queue, keeping files still referenced by later entries
+        async with self._lock(server_id):
+            files_to_remove = []
+            for _ in range(n_skips):
+                if track_queue:
+                    path, still_queued = _pop_track(queue_data)
+                    if not still_queued:
+                        files_to_remove.append(path)
 
         # If queue is now empty, disconnect
         if not track_queue:
             voice_client.stop()
-            await voice_client.disconnect()
-            self.queues.pop(server_id, None)
+            await self._terminate_playback(voice_client, server_id)
 
             # Remove files
             for path in files_to_remove:
-                self._try_remove_file(path)
+                self._remove_async(path)
             return
 
         # Otherwise, stop current playback and let the callback handle playing the next track
@@ -412,7 +549,7 @@ class MusicBot:
 
         # Remove files
         for path in files_to_remove:
-            self._try_remove_file(path)
+            self._remove_async(path)
 
     async def handle_play(self, ctx: commands.Context, query: str = None):
         """Play a given search query or URL from YouTube."""
@@ -439,78 +576,89 @@ class MusicBot:
         server_id = ctx.guild.id
 
         # Create download directory for this server
-        os.makedirs(f"./dl/{server_id}", exist_ok=True)
+        if not self.stream_audio:
+            os.makedirs(f"./dl/{server_id}", exist_ok=True)
 
         # Send a message and store it for later editing
         status_message = await ctx.send(f"Looking for `{query}`...")
 
         try:
-            # Extract info and download
-            with yt_dlp.YoutubeDL({
-                "format": "bestaudio[ext=webm]/bestaudio",
-                "source_address": "0.0.0.0",
-                "default_search": "ytsearch",
-                "outtmpl": f"./dl/{server_id}/%(id)s.%(ext)s",
-                "noplaylist": True,
-                "socket_timeout": 10,
-                "retries": 3,
-                "quiet": True
-            }) as ydl:
-                # First, extract info without downloading
-                info = ydl.extract_info(query, download=False)
-                if "entries" in info:
-                    if not info["entries"]:
-                        await status_message.edit(content="Couldn't find any results for your query.")
-                        return
-                    info = info["entries"][0]
-
-                # Download the file
-                ydl.download([info["webpage_url"]])
-
-            await status_message.edit(content=f"Added to queue: `{info['title']}`")
+            loop = asyncio.get_running_loop()
+
+            # Extract info in a worker thread to keep the event loop responsive,
+            # reusing a recent lookup for the same query when we have one.
+            # Stream URLs expire after a few hours, so streaming always resolves afresh.
+            cache_key = _meta_cache_key(query)
+            info = None if self.stream_audio else self._get_cached_info(cache_key)
+            if info is None:
+                info = await loop.run_in_executor(self._ydl_pool, _extract_info_sync, query, server_id)
+                if info is None:
+                    await status_message.edit(content="Couldn't find any results for your query.")
+                    return
+                if not self.stream_audio:
+                    self._cache_info(cache_key, info)
+
+            # When streaming, FFmpeg reads the media URL directly and nothing is downloaded
+            if self.stream_audio:
+                path = info["url"]
+            else:
+                path = f"./dl/{server_id}/{info['id']}.{info['ext']}"
 
-            path = f"./dl/{server_id}/{info['id']}.{info['ext']}"
+            # Download the file unless it is already on disk. If nothing is queued yet,
+            # connect to voice at the same time instead of after the download.
+            starting = self._active_queue(server_id) is None
+            if self.stream_audio or os.path.exists(path):
+                download = asyncio.sleep(0)
+            else:
+                download = loop.run_in_executor(self._ydl_pool, _download_sync, info, server_id)
+            connect = self._ensure_voice(ctx) if starting else asyncio.sleep(0)
+            connection, download_result = await asyncio.gather(connect, download, return_exceptions=True)
+            if isinstance(connection, Exception):
+                raise connection
 
             # Verify file exists
-            if not os.path.exists(path):
+            download_failed = isinstance(download_result, Exception) or (
+                not self.stream_audio and not os.path.exists(path)
+            )
+            if download_failed:
+                # Don't leave the bot sitting in voice with nothing to play
+                if connection and self._active_queue(server_id) is None:
+                    await self._safe_disconnect(connection)
+                if isinstance(download_result, Exception):
+                    raise download_result
                 await status_message.edit(content="Download failed. Please try again.")
                 return
 
+            await status_message.edit(content=f"Added to queue: `{info['title']}`")
+
             # Insert into the queue
-            if server_id not in self.queues:
-                self.queues[server_id] = {
-                    "queue": [],
-                    "loop": False,
-                    "volume": 1.0
-                }
-            track_queue = self.queues[server_id]["queue"]
-            track_queue.append((path, info))
+            async with self._lock(server_id):
+                if server_id not in self.queues:
+                    self.queues[server_id] = {
+                        "queue": deque(),
+                        "path_counts": Counter(),
+                        "loop": False,
+                        "volume": 1.0
+                    }
+                queue_data = self.queues[server_id]
+                track_queue = queue_data["queue"]
+                track_queue.append((path, info))
+                queue_data["path_counts"][path] += 1
+                start_playback = len(track_queue) == 1
+
+            # Get FFmpeg ready in case this track plays next
+            self._spawn(self._prefetch_next(server_id))
 
             # If this is the only track, start playing
-            if len(track_queue) == 1:
-                # Connect to voice if not connected
-                connection = self.get_voice_client_from_channel_id(ctx.author.voice.channel.id)
-                if not connection or not connection.is_connected():
-                    try:
-                        connection = await ctx.author.voice.channel.connect()
-                        await asyncio.sleep(1.0)  # Wait for connection to establish
-                    except Exception as e:
-                        logger.error(f"Error connecting to voice: {e}")
-                        connection = self.get_voice_client_from_channel_id(ctx.author.voice.channel.id)
+            if start_playback:
+                # Connect to voice if not connected, or wait for another command's connect
+                connection = await self._ensure_voice(ctx)
 
                 if connection and connection.is_connected():
-                    # Create audio source
-                    audio = discord.FFmpegOpusAudio(
-                        path,
-                        options="-ac 2 -b:a 96k -vbr on",
-                    )
-
-                    # Play the track
-                    connection.play(
-                        audio,
-                        after=lambda e: self._after_track(e, connection, server_id)
-                    )
+                    await self._play_queue_head(connection, server_id, queue_data)
                 else:
+                    # Nothing else will start this queue, so don't leave it behind
+                    await self._terminate_playback(connection, server_id)
                     await ctx.send("Failed to connect to voice channel.")
 
         except Exception as err:
@@ -520,21 +668,10 @@ class MusicBot:
                 import traceback
                 traceback.print_exc()
 
+    @_require_active
     async def handle_loop(self, ctx: commands.Context):
         """Toggle looping of the current queue."""
-        if not await self.sense_checks(ctx):
-            return
-
-        server_id = ctx.guild.id
-        if server_id not in self.queues:
-            await ctx.send("The bot isn't playing anything.")
-            return
-
-        qdata = self.queues[server_id]
-        if not qdata or not qdata["queue"]:
-            await ctx.send("The bot isn't playing anything.")
-            return
-
+        qdata = ctx.queue_data
         qdata["loop"] = not qdata["loop"]
 
         # Create embed response
@@ -545,28 +682,17 @@ class MusicBot:
         )
         await ctx.send(embed=embed)
 
+    @_require_active
     async def handle_now_playing(self, ctx: commands.Context):
         """Display information about the currently playing track."""
-        if not await self.sense_checks(ctx):
-            return
-
-        server_id = ctx.guild.id
-        if server_id not in self.queues:
-            await ctx.send("The bot isn't playing anything.")
-            return
-
-        queue_data = self.queues[server_id]
-        if not queue_data or not queue_data.get("queue"):
-            await ctx.send("The bot isn't playing anything.")
-            return
+        queue_data = ctx.queue_data
 
         # Get current track info
         _, info = queue_data["queue"][0]
 
         title = info.get("title", "Unknown")
         uploader = info.get("uploader", "Unknown")
-        duration = info.get("duration", 0)
-        duration_str = time.strftime("%M:%S", time.gmtime(duration)) if duration else "Unknown"
+        duration_str = _fmt_ms(int(info.get("duration") or 0))
         thumbnail = info.get("thumbnail", None)
 
         # Create embedded message
@@ -576,7 +702,7 @@ class MusicBot:
         embed.add_field(name="Duration", value=duration_str, inline=True)
 
         # Set volume info
-        volume = int(queue_data.get("volume", 1.0) * 100)
+        volume = int(queue_data["volume"] * 100)
         embed.add_field(name="Volume", value=f"{volume}%", inline=True)
 
         # Add thumbnail if available
@@ -619,24 +745,14 @@ class MusicBot:
         voice_client.resume()
         await ctx.send("Playback resumed.")
 
+    @_require_active
     async def handle_volume(self, ctx: commands.Context, volume: str = None):
         """Set the volume level (0-100)."""
-        if not await self.sense_checks(ctx):
-            return
-
-        server_id = ctx.guild.id
-        if server_id not in self.queues:
-            await ctx.send("The bot isn't playing anything.")
-            return
-
-        queue_data = self.queues[server_id]
-        if not queue_data or not queue_data.get("queue"):
-            await ctx.send("The bot isn't playing anything.")
-            return
+        queue_data = ctx.queue_data
 
         # Show current volume if no argument provided
         if volume is None:
-            current_vol = int(queue_data.get("volume", 1.0) * 100)
+            current_vol = int(queue_data["volume"] * 100)
             await ctx.send(f"Current volume: {current_vol}%")
             return
 
@@ -666,6 +782,9 @@ class MusicBot:
             await ctx.send("This command requires administrator permissions.")
             return
 
+        # Drop cached track metadata as well
+        self._meta_cache.clear()
+
         server_id = ctx.guild.id
         server_dir = f"./dl/{server_id}"
 
@@ -674,25 +793,31 @@ class MusicBot:
             await ctx.send("No files to clean up.")
             return
 
-        # Don't remove files that are in the current queue
+        # Don't remove files that are in the current queue. Queue paths are stored
+        # as "./dl/..." while glob() yields "dl/...", so normalize both sides.
         queue_files = set()
-        if server_id in self.queues and self.queues[server_id].get("queue"):
-            queue_files = {item[0] for item in self.queues[server_id]["queue"]}
-
-        # Count files that will be removed
-        files_removed = 0
-        for file_path in Path(server_dir).glob("*"):
-            if str(file_path) not in queue_files:
-                try:
-                    os.remove(file_path)
-                    files_removed += 1
-                except (PermissionError, FileNotFoundError) as e:
-                    logger.warning(f"Failed to remove {file_path}: {e}")
+        queue_data = self._active_queue(server_id)
+        if queue_data is not None:
+            queue_files = {os.path.normpath(path) for path, _ in queue_data["queue"]}
+
+        # Remove the files in a worker thread, waiting so the count is accurate
+        files_removed = await asyncio.get_running_loop().run_in_executor(
+            self._io_pool, _remove_unqueued_files, server_dir, queue_files
+        )
 
         await ctx.send(f"Cleaned up {files_removed} files.")
 
     async def handle_help(self, ctx: commands.Context):
         """Show help information."""
+        await ctx.send(embed=self._help_embed)
+
+    # Add this method to your MusicBot class:
+    async def handle_ayuda(self, ctx: commands.Context):
+        """Show help information in Spanish."""
+        await ctx.send(embed=self._ayuda_embed)
+
+    def _build_help_embed(self) -> discord.Embed:
+        """Build the help embed, which only depends on the fixed prefix."""
         commands_list = [
             (f"{self.prefix}play [query]", "Play a song from YouTube"),
             (f"{self.prefix}queue", "Show the current music queue"),
@@ -714,11 +839,10 @@ class MusicBot:
         for command, description in commands_list:
             embed.add_field(name=command, value=description, inline=False)
 
-        await ctx.send(embed=embed)
+        return embed
 
-    # Add this method to your MusicBot class:
-    async def handle_ayuda(self, ctx: commands.Context):
-        """Show help information in Spanish."""
+    def _build_ayuda_embed(self) -> discord.Embed:
+        """Build the Spanish help embed, which only depends on the fixed prefix."""
         commands_list = [
             (f"{self.prefix}play, {self.prefix}p", "Reproduce una canción de YouTube. Puedes agregar una busqueda o una URL. Por ejemplo .play aire jose merce, o .play https://www.youtube.com/watch?v=xzxyefhCQXg, ambas combinaciones funcionan"),
             (f"{self.prefix}queue, {self.prefix}lista, {self.prefix}q", "Muestra la cola de reproducción actual"),
@@ -743,7 +867,7 @@ class MusicBot:
         for command, description in commands_list:
             embed.add_field(name=command, value=description, inline=False)
 
-        await ctx.send(embed=embed)
+        return embed
 
     async def handle_command_error(self, ctx: commands.Context, error: commands.CommandError):
         """Handle errors gracefully."""
@@ -767,6 +891,12 @@ class MusicBot:
         if member != self.bot.user:
             return
 
+        # Keep the channel -> voice client map in sync (covers join, move and leave)
+        if before.channel is not None:
+            self._vc_by_channel.pop(before.channel.id, None)
+        if after.channel is not None and member.guild.voice_client is not None:
+            self._vc_by_channel[after.channel.id] = member.guild.voice_client
+
         # Bot joined a channel
         if before.channel is None and after.channel is not None:
             return
@@ -778,53 +908,57 @@ class MusicBot:
             # Clean up data
             self.queues.pop(server_id, None)
             self.skip_in_progress.discard(server_id)  # Clear skip flag
+            self._discard_prefetch(server_id)
 
             # Clean up downloads for this server in a separate task
             server_dir = f"./dl/{server_id}/"
             if os.path.exists(server_dir):
-                self.bot.loop.create_task(self._delayed_directory_cleanup(server_dir))
+                self._spawn(self._delayed_directory_cleanup(server_dir))
 
     # -----------------------------------------------------------------
     #                    PLAYBACK & HELPER METHODS
     # -----------------------------------------------------------------
 
-    def _after_track(self, error, connection, server_id):
+    def _after_track(self, error, *, connection, server_id):
         """Called after a track finishes."""
         if error:
             logger.error(f"Playback error: {error}")
 
-        # Run after_track_async in event loop
-        asyncio.run_coroutine_threadsafe(
-            self._after_track_async(error, connection, server_id),
-            self.bot.loop
+        # Wake anything waiting for this track to end
+        track_ended = self._track_ended.get(server_id)
+        if track_ended is not None:
+            self.bot.loop.call_soon_threadsafe(track_ended.set)
+
+        # Run after_track_async in event loop. We don't need its result, so schedule
+        # the task directly rather than going through run_coroutine_threadsafe's Future.
+        self.bot.loop.call_soon_threadsafe(
+            self._spawn,
+            self._after_track_async(error, connection, server_id)
         )
 
     async def _after_track_async(self, error, connection, server_id):
         """Async version of after_track to properly handle async operations."""
         try:
-            # Wait briefly for system to stabilize
-            await asyncio.sleep(0.5)
-
             # Check if server still in queues
-            if server_id not in self.queues:
+            queue_data = self.queues.get(server_id)
+            if queue_data is None:
                 logger.info(f"Server {server_id} no longer in queues, ending playback")
                 self.skip_in_progress.discard(server_id)  # Clear flag
                 return
 
             # Check if connection is still valid
-            if not connection or not hasattr(connection, 'is_connected') or not connection.is_connected():
+            if connection is None or not connection.is_connected():
                 logger.warning("Connection no longer valid")
-                self.queues.pop(server_id, None)
+                await self._terminate_playback(connection, server_id)
                 return
 
-            track_queue = self.queues[server_id]["queue"]
-            loop_enabled = self.queues[server_id]["loop"]
+            track_queue = queue_data["queue"]
+            loop_enabled = queue_data["loop"]
 
             if not track_queue:
                 # Empty queue - disconnect
                 logger.info("Queue empty, disconnecting")
-                await connection.disconnect()
-                self.queues.pop(server_id, None)
+                await self._terminate_playback(connection, server_id)
                 return
 
             # Get current track before modifying queue
@@ -840,109 +974,213 @@ class MusicBot:
             else:
                 # Only remove track if NOT a skip operation and not looping
                 if not loop_enabled:
-                    track_queue.pop(0)
+                    _pop_track(queue_data)
 
-            # If queue is now empty, disconnect
+            # If queue is now empty, disconnect and clean up the last file
             if not track_queue:
                 logger.info("No more tracks, disconnecting")
-                await connection.disconnect()
-                self.queues.pop(server_id, None)
-
-                # Clean up the last file
-                if not loop_enabled:
-                    self._try_remove_file(last_path)
+                await self._terminate_playback(connection, server_id, last_path, remove_file=not loop_enabled)
                 return
 
             # Check if we should remove the last file
-            if not loop_enabled and all(last_path != item[0] for item in track_queue):
-                self._try_remove_file(last_path)
+            if not loop_enabled and last_path not in queue_data["path_counts"]:
+                self._remove_async(last_path)
 
-            # Get next track
-            next_path = track_queue[0][0]
+            # Optional pause between tracks
+            if self.track_gap_seconds:
+                await asyncio.sleep(self.track_gap_seconds)
 
-            # Check if file exists
-            if not os.path.exists(next_path):
-                logger.error(f"File not found: {next_path}")
-                track_queue.pop(0)
+            await self._play_queue_head(connection, server_id, queue_data)
 
-                if track_queue:
-                    # Try next track
-                    await self._after_track_async(None, connection, server_id)
-                else:
-                    # No more tracks
-                    await connection.disconnect()
-                    self.queues.pop(server_id, None)
-                return
+        except Exception as err:
+            logger.error(f"Error in _after_track_async: {err}")
+            # Try to disconnect
+            try:
+                await self._terminate_playback(connection, server_id)
+            except Exception as e:
+                logger.debug(f"Disconnect cleanup suppressed: {e}")
 
-            # Wait a moment to ensure clean state
-            await asyncio.sleep(0.5)
+    async def _play_queue_head(self, connection: discord.VoiceClient, server_id: int, queue_data: Dict[str, Any]):
+        """Play the track at the head of the queue, dropping any that are missing or fail to start.
+
+        Ends the session if no playable track is left.
+        """
+        # The session may have ended or been replaced meanwhile, e.g. during the gap between tracks
+        if self.queues.get(server_id) is not queue_data:
+            return
+
+        track_queue = queue_data["queue"]
+        while track_queue:
+            next_path = track_queue[0][0]
 
-            # Try to play next track
             try:
-                audio = discord.FFmpegOpusAudio(
-                    next_path,
-                    options="-ac 2 -b:a 96k -vbr on",
-                )
+                # Use the source prepared during the previous track if we have one
+                audio = self._take_prefetched(server_id, next_path) or self._make_source(next_path)
 
                 connection.play(
                     audio,
-                    after=lambda e: self._after_track(e, connection, server_id)
+                    after=functools.partial(self._after_track, connection=connection, server_id=server_id)
                 )
+                self._spawn(self._prefetch_next(server_id))
+                return
             except Exception as e:
                 logger.error(f"Error playing next track: {e}")
-                # Try to recover
-                track_queue.pop(0)
-                if track_queue:
-                    await self._after_track_async(None, connection, server_id)
-                else:
-                    await connection.disconnect()
-                    self.queues.pop(server_id, None)
+                # Try to recover with the following track
+                path, still_queued = _pop_track(queue_data)
+                if not still_queued:
+                    self._remove_async(path)
+
+        # No more tracks
+        await self._terminate_playback(connection, server_id)
+
+    async def _terminate_playback(self, connection: Optional[discord.VoiceClient], server_id: int,
+                                  last_path: Optional[str] = None, remove_file: bool = True):
+        """Drop the server's playback state, disconnect and remove the last played file.
+
+        The server lock is held until the disconnect completes, so a play command
+        arriving meanwhile waits and reconnects instead of queueing onto a voice
+        client that is about to go away.
+        """
+        async with self._lock(server_id):
+            self.queues.pop(server_id, None)
+            self.skip_in_progress.discard(server_id)
+            self._discard_prefetch(server_id)
+            if connection is not None and connection.is_connected():
+                await connection.disconnect()
 
-        except Exception as err:
-            logger.error(f"Error in _after_track_async: {err}")
-            # Try to disconnect
-            try:
-                if connection and connection.is_connected():
-                    await connection.disconnect()
-                self.queues.pop(server_id, None)
-            except:
-                pass
+        if remove_file and last_path:
+            self._remove_async(last_path)
 
     async def _delayed_directory_cleanup(self, directory_path, delay=5.0):
         """Clean up a directory after a delay to avoid file lock issues."""
         try:
             await asyncio.sleep(delay)
-            if os.path.exists(directory_path):
-                # First try to remove individual files
-                for file_path in Path(directory_path).glob("*"):
-                    try:
-                        os.remove(file_path)
-                    except:
-                        pass
-
-                # Then try to remove the directory
-                try:
-                    shutil.rmtree(directory_path)
-                except Exception as e:
-                    logger.warning(f"Failed to remove directory {directory_path}: {e}")
+            await asyncio.get_running_loop().run_in_executor(self._io_pool, _cleanup_dir_sync, directory_path)
         except Exception as e:
             logger.error(f"Error in directory cleanup: {e}")
 
+    def _make_source(self, path: str) -> discord.FFmpegOpusAudio:
+        """Create the FFmpeg audio source for a queued file or stream URL.
+
+        Raises FileNotFoundError if a downloaded file has gone missing.
+        """
+        if self.stream_audio:
+            return discord.FFmpegOpusAudio(
+                path,
+                before_options=FFMPEG_STREAM_BEFORE_OPTIONS,
+                options=FFMPEG_OPTIONS,
+            )
+
+        # FFmpeg starts fine on a missing input and just exits, which would look
+        # like a track that finished instantly, so check before spawning it
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File not found: {path}")
+        return discord.FFmpegOpusAudio(path, options=FFMPEG_OPTIONS)
+
+    async def _prefetch_next(self, server_id: int):
+        """Start FFmpeg for the track after the current one, so it's warm when that track starts."""
+        queue_data = self.queues.get(server_id)
+        if queue_data is None:
+            return
+
+        # With looping on, the current track plays again next
+        track_queue = queue_data["queue"]
+        next_index = 0 if queue_data["loop"] else 1
+        if len(track_queue) <= next_index:
+            return
+
+        next_path = track_queue[next_index][0]
+        prefetched = self._prefetched.get(server_id)
+        if prefetched is not None and prefetched[0] == next_path:
+            return
+
+        try:
+            source = await asyncio.get_running_loop().run_in_executor(self._io_pool, self._make_source, next_path)
+        except Exception as e:
+            logger.warning(f"Failed to prefetch {next_path}: {e}")
+            return
+
+        # Playback may have ended while FFmpeg was starting
+        if self.queues.get(server_id) is not queue_data:
+            source.cleanup()
+            return
+
+        self._discard_prefetch(server_id)
+        self._prefetched[server_id] = (next_path, source)
+
+    def _take_prefetched(self, server_id: int, path: str) -> Optional[discord.FFmpegOpusAudio]:
+        """Return the prefetched source for `path`, discarding it if it's for another track."""
+        prefetched = self._prefetched.pop(server_id, None)
+        if prefetched is None:
+            return None
+
+        prefetched_path, source = prefetched
+        if prefetched_path != path:
+            source.cleanup()
+            return None
+        return source
+
+    def _discard_prefetch(self, server_id: int):
+        """Stop the FFmpeg process of a prefetched source, if any."""
+        prefetched = self._prefetched.pop(server_id, None)
+        if prefetched is not None:
+            prefetched[1].cleanup()
+
+    def _remove_async(self, path: str):
+        """Remove a file in the background without blocking the event loop.
+
+        _try_remove_file() may sleep between retries, so it must not run on the loop.
+        """
+        self._io_pool.submit(self._try_remove_file, path)
+
     def _try_remove_file(self, path: str):
         """Try to remove a file, with retries."""
+        # Streamed tracks have no local file
+        if self.stream_audio:
+            return True
         for _ in range(5):
             try:
-                if os.path.exists(path):
-                    os.remove(path)
+                os.remove(path)
+                return True
+            except FileNotFoundError:
+                # Already gone, e.g. removed by another cleanup
                 return True
-            except (PermissionError, FileNotFoundError):
+            except PermissionError:
+                # The file may still be held open by FFmpeg (Windows)
                 time.sleep(1)
+            except OSError as e:
+                # Runs on the I/O pool, where nothing else would report it
+                logger.warning(f"Failed to remove {path}: {e}")
+                return False
         return False
 
+    async def _ensure_voice(self, ctx: commands.Context) -> Optional[discord.VoiceClient]:
+        """Return a voice client for the author's channel, connecting if needed."""
+        channel = ctx.author.voice.channel
+        connection = self.get_voice_client_from_channel_id(channel.id)
+        if connection and connection.is_connected():
+            return connection
+
+        # discord.py rejects a second connect while the first is still handshaking,
+        # so commands arriving meanwhile wait on the one already in flight.
+        # connect() only returns once the voice handshake has completed.
+        server_id = ctx.guild.id
+        connect_task = self._connecting.get(server_id)
+        if connect_task is None or connect_task.done():
+            connect_task = self._spawn(channel.connect())
+            self._connecting[server_id] = connect_task
+        try:
+            # Shielded so one command being cancelled doesn't abort the others' connect
+            connection = await asyncio.shield(connect_task)
+        except Exception as e:
+            logger.error(f"Error connecting to voice: {e}")
+            connection = self.get_voice_client_from_channel_id(channel.id)
+        return connection
+
     async def _safe_disconnect(self, connection: discord.VoiceClient):
         """Gracefully disconnect if still connected."""
         try:
-            if connection and hasattr(connection, 'is_connected') and connection.is_connected():
+            if connection is not None and connection.is_connected():
                 # Stop any playing audio first
                 if connection.is_playing() or connection.is_paused():
                     connection.stop()
@@ -958,28 +1196,21 @@ class MusicBot:
     async def _notify_about_failure(self, ctx: commands.Context, err: yt_dlp.utils.DownloadError, status_message=None):
         """Handle download errors."""
         if self.report_dl_error:
-            sanitized = re.compile(r"\x1b[^m]*m").sub("", err.msg).strip()
-            if sanitized.lower().startswith("error"):
-                sanitized = sanitized[5:].strip(" :")
+            sanitized = _ANSI_RE.sub("", err.msg).strip()
+            sanitized = _ERROR_PREFIX_RE.sub("", sanitized, count=1)
 
             error_msg = f"Failed to download due to error: {sanitized}"
-            if status_message:
-                await status_message.edit(content=error_msg)
-            else:
-                await ctx.send(error_msg)
         else:
             error_msg = "Sorry, failed to download this video."
-            if status_message:
-                await status_message.edit(content=error_msg)
-            else:
-                await ctx.send(error_msg)
+
+        if status_message:
+            await status_message.edit(content=error_msg)
+        else:
+            await ctx.send(error_msg)
 
     def get_voice_client_from_channel_id(self, channel_id: int):
         """Return the voice client connected to `channel_id`, or None."""
-        for vc in self.bot.voice_clients:
-            if vc.channel and vc.channel.id == channel_id:
-                return vc
-        return None
+        return self._vc_by_channel.get(channel_id)
 
     async def sense_checks(self, ctx: commands.Context) -> bool:
         """Perform basic checks for voice commands."""
@@ -998,14 +1229,40 @@ class MusicBot:
 
         return True
 
-    def run(self):
-        """Start the bot."""
+    def _spawn(self, coro) -> asyncio.Task:
+        """Start a background task, keeping a reference so it isn't garbage collected."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
+
+    async def _run_async(self):
+        """Run the bot until it closes, then wait for pending background tasks."""
+        if sys.version_info >= (3, 12):
+            # Run new tasks synchronously up to their first real suspension; many of
+            # ours (e.g. prefetching with nothing else queued) never suspend at all
+            asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
+        try:
+            async with self.bot:
+                await self.bot.start(self.token)
+        finally:
+            if self._bg_tasks:
+                await asyncio.gather(*self._bg_tasks, return_exceptions=True)
+
+    def run(self, loop_factory=None):
+        """Start the bot, on an event loop from `loop_factory` if one is given."""
         if not self.token:
             logger.error("No token provided. Please put BOT_TOKEN in .env")
             sys.exit(1)
 
         try:
-            self.bot.run(self.token)
+            if loop_factory is not None:
+                asyncio.run(self._run_async(), loop_factory=loop_factory)
+            else:
+                asyncio.run(self._run_async())
+        except KeyboardInterrupt:
+            pass
         except discord.LoginFailure:
             logger.error("Invalid token. Check your BOT_TOKEN in .env")
             sys.exit(1)
@@ -1022,8 +1279,25 @@ class MusicBot:
 # -----------------------------------------------------------------
 def main():
     """Main entry point for the bot."""
+    # Use a faster event loop implementation when one is installed
+    try:
+        import uvloop as fast_loop
+    except ImportError:
+        try:
+            import winloop as fast_loop
+        except ImportError:
+            fast_loop = None
+
+    loop_factory = None
+    if fast_loop is not None:
+        if sys.version_info >= (3, 12):
+            # install() is deprecated here; asyncio.run() takes the loop factory instead
+            loop_factory = fast_loop.new_event_loop
+        else:
+            fast_loop.install()
+
     bot = MusicBot()
-    bot.run()
+    bot.run(loop_factory)
 
 
 if __name__ == "__main__":